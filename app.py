@@ -2,64 +2,280 @@
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import chess
+import orjson
 import time
 import random
 import secrets
 import threading
+import heapq
+import logging
+import logging.handlers
+import queue
+import sys
+import atexit
+from contextlib import contextmanager
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = secrets.token_hex(16)
 
-# async_mode threading works without extra deps; eventlet/gevent may be used but not required.
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+class OrjsonCodec:
+    """json-module stand-in so Socket.IO packets are encoded with orjson."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj).decode()
 
-# In-memory games store
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+# async_mode threading works without extra deps; eventlet/gevent may be used but not required.
+socketio = SocketIO(app, json=OrjsonCodec, cors_allowed_origins="*", async_mode="threading")
+
+# Log records are queued by handlers and written to stderr by a listener
+# thread, so no handler (or held room lock) waits on the write() itself.
+# Per-move/per-connection lines are DEBUG; room lifecycle and results are INFO.
+_log_queue = queue.Queue(-1)
+_log_stream = logging.StreamHandler(sys.stderr)
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger("chess_app")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+
+# In-memory games store: room name -> GameState
 games = {}
 
+
+class GameState:
+    """State of one room. __slots__ keeps field access and per-room size small."""
+
+    __slots__ = (
+        "board", "players", "whiteTime", "blackTime", "lastUpdate",
+        "winner", "reason", "bot", "bot_color", "draw_offer", "lock",
+        "state_cache", "pending_updates", "flush_scheduled", "last_flush",
+        "emit_lock", "turn_gen", "seq", "legal_cache",
+    )
+
+    def __init__(self, board, white_sid, time_control, is_bot):
+        self.board = board
+        self.players = {"white": white_sid, "black": None}
+        self.whiteTime = float(time_control)
+        self.blackTime = float(time_control)
+        self.lastUpdate = time.time()
+        self.winner = None
+        self.reason = None
+        self.bot = is_bot
+        self.bot_color = "black" if is_bot else None
+        self.draw_offer = None
+        self.lock = threading.Lock()  # ← FIXED: Add thread safety
+        self.state_cache = None
+        self.pending_updates = []
+        self.flush_scheduled = False
+        self.last_flush = 0.0
+        self.emit_lock = threading.Lock()
+        self.turn_gen = 0
+        self.seq = 0
+        self.legal_cache = None
+
+
+# Min-heap of (deadline, room, turn_gen) read by timeout_watcher
+_deadlines = []
+_deadlines_cv = threading.Condition()
+_watcher_thread = None
+
 # Stockfish OFF by user choice B — bot will play random legal moves
 engine = None
-print("ℹ Stockfish disabled — bot will play random moves")
+logger.info("ℹ Stockfish disabled — bot will play random moves")
 
 @app.route("/")
 def index():
     return render_template("ui.html")
 
 
-def board_to_matrix(board: chess.Board):
-    """Convert python-chess board to 8x8 matrix for the UI."""
-    grid = [["." for _ in range(8)] for _ in range(8)]
-    for sq, piece in board.piece_map().items():
-        file = chess.square_file(sq)
-        rank = chess.square_rank(sq)
-        row = 7 - rank
-        col = file
-        grid[row][col] = piece.symbol()
-    return grid
+# UI coordinates: row 0 is rank 8, col 0 is the a-file
+SQ_TO_RC = tuple((7 - (sq >> 3), sq & 7) for sq in range(64))
+RC_TO_SQ = tuple(tuple(((7 - r) << 3) | c for c in range(8)) for r in range(8))
+
+def pos_to_square(pos):
+    """Square for a client {row, col}, or None if it is off the board."""
+    row = pos["row"]
+    col = pos["col"]
+    if 0 <= row < 8 and 0 <= col < 8:
+        return RC_TO_SQ[row][col]
+    return None
+
+_EMPTY_GRID = b"." * 64
+
+# New games copy this instead of running Board() and its FEN setup
+_STARTING_BOARD = chess.Board()
+
+# Promotion letter sent by the UI -> python-chess piece type
+_PROMO = {"q": chess.QUEEN, "r": chess.ROOK, "b": chess.BISHOP, "n": chess.KNIGHT}
+
+# Module-level aliases so on_move skips the chess.<attr> lookups per event
+_Move = chess.Move
+_QUEEN = chess.QUEEN
+
+# SYMBOL_TABLE[color][piece_type] -> ASCII code of the piece letter
+SYMBOL_TABLE = (
+    tuple([0] + [ord(chess.piece_symbol(pt)) for pt in chess.PIECE_TYPES]),
+    tuple([0] + [ord(chess.piece_symbol(pt).upper()) for pt in chess.PIECE_TYPES]),
+)
+
+def board_to_str(board: chess.Board):
+    """Convert python-chess board to a 64-char string for the UI.
+
+    Characters run row by row from a8 to h1 ("." for empty squares); the UI
+    splits it back into an 8x8 grid. Squares are written into a flat buffer
+    (``sq ^ 56`` flips the bitboard order into UI row order), reading pieces
+    straight from the bitboards, lowest set bit first.
+    """
+    buf = bytearray(_EMPTY_GRID)
+    for color in chess.COLORS:
+        symbols = SYMBOL_TABLE[color]
+        for pt in chess.PIECE_TYPES:
+            bb = board.pieces_mask(pt, color)
+            while bb:
+                sq = (bb & -bb).bit_length() - 1
+                buf[sq ^ 56] = symbols[pt]
+                bb &= bb - 1
+    return buf.decode("ascii")
+
+# Preformatted M:SS strings for every clock value up to one hour
+_FMT = tuple(f"{t // 60}:{t % 60:02d}" for t in range(3601))
 
 def format_seconds(sec: float) -> str:
     """Format seconds into M:SS (e.g. 5:00, 4:07)."""
     total = int(max(0, round(sec)))
+    if total < len(_FMT):
+        return _FMT[total]
     m = total // 60
     s = total % 60
     return f"{m}:{s:02d}"
 
+@contextmanager
+def clock_write(g):
+    """Seqlock write section for clock/turn/winner fields.
+
+    Caller must hold g.lock so writers stay serialized; readers never
+    take the lock and retry while the sequence number is odd. Do not read
+    the clock (export_state, send_game_update) inside this block.
+    """
+    g.seq += 1
+    try:
+        yield
+    finally:
+        g.seq += 1
+
+def read_clock(g):
+    """Consistent lock-free snapshot of the clock (seqlock read side).
+
+    Returns (whiteTime, blackTime, lastUpdate, winner, white_to_move).
+    """
+    while True:
+        seq = g.seq
+        if seq & 1:
+            time.sleep(0)  # writer in progress
+            continue
+        snap = (g.whiteTime, g.blackTime, g.lastUpdate, g.winner, g.board.turn)
+        if g.seq == seq:
+            return snap
+
+def remaining_times(g, now=None):
+    """Return (white, black, white_to_move) with seconds left right now.
+
+    Stored clocks are snapshots taken when the current turn started; the side
+    to move is charged for the time elapsed since lastUpdate. All three values
+    come from one read_clock snapshot.
+    """
+    white, black, last_update, winner, white_to_move = read_clock(g)
+    if winner:
+        return white, black, white_to_move
+    elapsed = (time.time() if now is None else now) - last_update
+    if white_to_move:
+        white = max(0.0, white - elapsed)
+    else:
+        black = max(0.0, black - elapsed)
+    return white, black, white_to_move
+
 def export_state(room):
-    """Export current game state for a room."""
+    """Export current game state for a room.
+
+    The board part is cached per (position, winner, reason) so repeated emits
+    for an unchanged position skip board_to_str; clocks are always fresh.
+    """
     g = games[room]
-    b: chess.Board = g["board"]
-    return {
-        "board": board_to_matrix(b),
-        "turn": "white" if b.turn else "black",
-        "check": b.is_check(),
-        "winner": g["winner"],
-        "reason": g["reason"],
+    b: chess.Board = g.board
+    key = (b._transposition_key(), g.winner, g.reason)
+    cached = g.state_cache
+    if cached is None or cached[0] != key:
+        cached = (key, {
+            "board": board_to_str(b),
+            "turn": "white" if b.turn else "black",
+            "check": b.is_check(),
+            "winner": g.winner,
+            "reason": g.reason,
+        })
+        g.state_cache = cached
+
+    state = dict(cached[1])
+    state.update(export_clock(g))
+    return state
+
+def export_clock(g, with_turn=False):
+    """Export only the clock fields, for updates that don't touch the board.
+
+    with_turn adds the side to move from the same snapshot as the clocks.
+    """
+    white, black, white_to_move = remaining_times(g)
+    clock = {
         # Keep numeric seconds (client doesn't require, but useful)
-        "whiteTime": int(g["whiteTime"]),
-        "blackTime": int(g["blackTime"]),
+        "whiteTime": int(white),
+        "blackTime": int(black),
         # Add formatted strings expected by UI
-        "whiteTimeFormatted": format_seconds(g["whiteTime"]),
-        "blackTimeFormatted": format_seconds(g["blackTime"]),
+        "whiteTimeFormatted": format_seconds(white),
+        "blackTimeFormatted": format_seconds(black),
     }
+    if with_turn:
+        clock["turn"] = "white" if white_to_move else "black"
+    return clock
+
+def _legal_entry(g):
+    """Cached legal-move data for the current position.
+
+    Returns (turn_gen, moves, {(from, to, promotion)}, {from_square: [moves]}).
+    The cache is keyed by g.turn_gen, which every push and reset bumps,
+    so an entry built while a move was being made is never served.
+    """
+    gen = g.turn_gen
+    cached = g.legal_cache
+    if cached is not None and cached[0] == gen:
+        return cached
+    moves = list(g.board.generate_legal_moves())
+    by_from = {}
+    for m in moves:
+        by_from.setdefault(m.from_square, []).append(m)
+    entry = (gen, moves, frozenset((m.from_square, m.to_square, m.promotion) for m in moves), by_from)
+    if g.turn_gen == gen:
+        g.legal_cache = entry
+    return entry
+
+def legal(g):
+    """Legal moves of the current position, generated once per position."""
+    return _legal_entry(g)[1]
+
+def legal_set(g):
+    """Set of (from_square, to_square, promotion) for O(1) legality checks."""
+    return _legal_entry(g)[2]
+
+def legal_by_from(g):
+    """Legal moves of the current position grouped by origin square."""
+    return _legal_entry(g)[3]
 
 def move_to_notation(board: chess.Board, move):
     """Convert move to algebraic notation (SAN)."""
@@ -70,44 +286,75 @@ def move_to_notation(board: chess.Board, move):
         to_sq = chess.square_name(move.to_square)
         return f"{from_sq}{to_sq}"
 
-def send_game_update(room, move_obj=None):
-    """Send full game state + lastMove (from/to) to all clients in room."""
+# An update goes out at once unless the room flushed less than this long
+# ago; updates arriving inside that window are held and sent as one frame.
+UPDATE_FLUSH_DELAY = 0.02
+
+def flush_game_updates(room):
+    """Emit all queued game updates for a room as one game_updates_batch."""
+    g = games.get(room)
+    if g is None:
+        return
+    with g.emit_lock:
+        batch = g.pending_updates
+        g.pending_updates = []
+        g.flush_scheduled = False
+        if batch:
+            g.last_flush = time.time()
+            socketio.emit("game_updates_batch", {"updates": batch}, room=room)
+
+def _delayed_flush(room, delay):
+    socketio.sleep(delay)
+    flush_game_updates(room)
+
+def send_game_update(room, move_obj=None, move_notation=None):
+    """Queue full game state + lastMove (from/to) for all clients in room.
+
+    move_notation is the SAN of move_obj, computed by the caller before the
+    move was pushed. The update is flushed immediately unless a flush is
+    already pending or the room flushed within UPDATE_FLUSH_DELAY; then it
+    waits for the rest of that window. A result (winner set) is never held.
+    """
+    g = games[room]
     last_move = None
-    move_notation = None
 
     if move_obj:
-        from_row = 7 - chess.square_rank(move_obj.from_square)
-        from_col = chess.square_file(move_obj.from_square)
-        to_row = 7 - chess.square_rank(move_obj.to_square)
-        to_col = chess.square_file(move_obj.to_square)
+        from_row, from_col = SQ_TO_RC[move_obj.from_square]
+        to_row, to_col = SQ_TO_RC[move_obj.to_square]
         last_move = {
             "from": {"row": from_row, "col": from_col},
             "to": {"row": to_row, "col": to_col},
         }
 
-        # notation: get SAN by undoing last move on a copy
-        g = games[room]
-        board_copy = g["board"].copy()
-        board_copy.pop()
-        move_notation = move_to_notation(board_copy, move_obj)
+    update = {
+        "state": export_state(room),
+        "lastMove": last_move,
+        "moveNotation": move_notation
+    }
 
-    socketio.emit(
-        "game_update",
-        {
-            "state": export_state(room),
-            "lastMove": last_move,
-            "moveNotation": move_notation
-        },
-        room=room,
-    )
+    delay = None
+    with g.emit_lock:
+        g.pending_updates.append(update)
+        if g.winner:
+            delay = 0.0
+        elif not g.flush_scheduled:
+            g.flush_scheduled = True
+            delay = g.last_flush + UPDATE_FLUSH_DELAY - time.time()
+
+    if delay is None:
+        return  # a pending flush will pick this update up
+    if delay <= 0:
+        flush_game_updates(room)
+    else:
+        socketio.start_background_task(_delayed_flush, room, delay)
 
 @socketio.on("connect")
 def on_connect():
-    print(f"✅ Client connected: {request.sid}")
+    logger.debug("✅ Client connected: %s", request.sid)
 
 @socketio.on("disconnect")
 def on_disconnect():
-    print(f"❌ Client disconnected: {request.sid}")
+    logger.debug("❌ Client disconnected: %s", request.sid)
 
 @socketio.on("create_room")
 def on_create_room(data):
@@ -115,22 +362,10 @@ def on_create_room(data):
     is_bot = data.get("bot", False)
     time_control = data.get("timeControl", 300)
 
-    print(f"🚪 Creating room '{room}', bot={is_bot}, time={time_control}s, sid={request.sid}")
-
-    board = chess.Board()
-    games[room] = {
-        "board": board,
-        "players": {"white": request.sid, "black": None},
-        "whiteTime": float(time_control),
-        "blackTime": float(time_control),
-        "lastUpdate": time.time(),
-        "winner": None,
-        "reason": None,
-        "bot": is_bot,
-        "bot_color": "black" if is_bot else None,
-        "draw_offer": None,
-        "lock": threading.Lock(),  # ← FIXED: Add thread safety
-    }
+    logger.info("🚪 Creating room '%s', bot=%s, time=%ss, sid=%s", room, is_bot, time_control, request.sid)
+
+    g = games[room] = GameState(_STARTING_BOARD.copy(stack=False), request.sid, time_control, is_bot)
+    schedule_deadline(room, g)
 
     join_room(room)
 
@@ -144,53 +379,56 @@ def on_create_room(data):
         },
     )
 
-    print(f"✅ Room '{room}' created successfully")
+    logger.info("✅ Room '%s' created successfully", room)
 
 @socketio.on("join_room")
 def on_join_room(data):
     room = data["room"]
-    print(f"➡️ Attempting to join room '{room}', sid={request.sid}")
+    logger.debug("➡️ Attempting to join room '%s', sid=%s", room, request.sid)
 
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         emit("error", {"message": "Room does not exist"})
-        print(f"❌ Room '{room}' does not exist")
+        logger.info("❌ Room '%s' does not exist", room)
         return
 
-    g = games[room]
-
-    if g["bot"]:
+    if g.bot:
         emit("error", {"message": "Cannot join bot game"})
-        print(f"❌ Cannot join bot game '{room}'")
+        logger.info("❌ Cannot join bot game '%s'", room)
         return
 
-    if g["players"]["black"] is not None:
+    if g.players["black"] is not None:
         emit("error", {"message": "Room is full"})
-        print(f"❌ Room '{room}' is full")
+        logger.info("❌ Room '%s' is full", room)
         return
 
-    g["players"]["black"] = request.sid
-    g["lastUpdate"] = time.time()
+    g.players["black"] = request.sid
+    # White's clock has been running since create; charge the wait so the
+    # stored clock matches what get_time reported
+    with g.lock, clock_write(g):
+        update_time_before_move(g)
     join_room(room)
 
+    # Both emits carry the same snapshot; export it once
+    state = export_state(room)
     emit(
         "room_joined",
         {
             "room": room,
             "color": "black",
-            "state": export_state(room),
+            "state": state,
             "bot": False,
         },
     )
 
-    socketio.emit("game_start", {"state": export_state(room)}, room=room)
-    print(f"✅ Player joined room '{room}' as BLACK. Game starting!")
+    socketio.emit("game_start", {"state": state}, room=room)
+    logger.info("✅ Player joined room '%s' as BLACK. Game starting!", room)
 
 @socketio.on("leave_room")
 def on_leave_room(data):
     room = data["room"]
-    if room in games:
-        print(f"🚪 Deleting room '{room}'")
-        del games[room]
+    if games.pop(room, None) is not None:
+        logger.info("🚪 Deleting room '%s'", room)
     leave_room(room)
 
 @socketio.on("get_possible_moves")
@@ -198,260 +436,307 @@ def on_get_possible_moves(data):
     room = data["room"]
     from_pos = data["from"]
 
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
 
-    board: chess.Board = games[room]["board"]
-    from_sq = chess.square(from_pos["col"], 7 - from_pos["row"])
+    from_sq = pos_to_square(from_pos)
+    if from_sq is None:
+        emit("possible_moves", {"moves": []})
+        return
 
-    moves = []
-    for mv in board.legal_moves:
-        if mv.from_square == from_sq:
-            r = 7 - chess.square_rank(mv.to_square)
-            c = chess.square_file(mv.to_square)
-            moves.append({"row": r, "col": c})
+    moves = [
+        {"row": r, "col": c}
+        for r, c in (SQ_TO_RC[mv.to_square] for mv in legal_by_from(g).get(from_sq, ()))
+    ]
 
     emit("possible_moves", {"moves": moves})
 
 @socketio.on("get_time")
 def on_get_time(data):
     room = data["room"]
-    if room not in games:
-        return
-
-    g = games[room]
-    board: chess.Board = g["board"]
-
-    if g["winner"]:
-        emit(
-            "time_update",
-            {
-                "whiteTime": int(g["whiteTime"]),
-                "blackTime": int(g["blackTime"]),
-                "whiteTimeFormatted": format_seconds(g["whiteTime"]),
-                "blackTimeFormatted": format_seconds(g["blackTime"]),
-            },
-        )
+    g = games.get(room)
+    if g is None:
         return
-
-    # ← FIXED: Thread-safe time updates
-    with g["lock"]:
-        now = time.time()
-        elapsed = now - g["lastUpdate"]
-        g["lastUpdate"] = now
-
-        turn = "white" if board.turn else "black"
-
-        if turn == "white":
-            g["whiteTime"] = max(0.0, g["whiteTime"] - elapsed)
-            if g["whiteTime"] == 0.0 and not g["winner"]:
-                g["winner"] = "black"
-                g["reason"] = "timeout"
-                print(f"⏱️ WHITE timed out in room '{room}'")
-                send_game_update(room)
-        else:
-            g["blackTime"] = max(0.0, g["blackTime"] - elapsed)
-            if g["blackTime"] == 0.0 and not g["winner"]:
-                g["winner"] = "white"
-                g["reason"] = "timeout"
-                print(f"⏱️ BLACK timed out in room '{room}'")
-                send_game_update(room)
-
-    emit(
-        "time_update",
-        {
-            "whiteTime": int(g["whiteTime"]),
-            "blackTime": int(g["blackTime"]),
-            "whiteTimeFormatted": format_seconds(g["whiteTime"]),
-            "blackTimeFormatted": format_seconds(g["blackTime"]),
-        },
-    )
+    # Pure read: the clocks come from the seqlock snapshot and flag falls are
+    # declared by timeout_watcher, so polling never takes the room lock.
+    emit("time_update", export_clock(g, with_turn=True))
 
 # ← FIXED: New thread-safe time update function
 def update_time_before_move(g):
-    """Thread-safe time update with timeout detection."""
+    """Thread-safe time update with timeout detection.
+
+    Caller holds g.lock inside a clock_write() section.
+    """
     now = time.time()
-    elapsed = now - g["lastUpdate"]
-    board = g["board"]
+    elapsed = now - g.lastUpdate
+    board = g.board
     
     # Subtract time from current player
     if board.turn:  # White's turn
-        g["whiteTime"] = max(0.0, g["whiteTime"] - elapsed)
-        if g["whiteTime"] == 0.0 and not g["winner"]:
-            g["winner"] = "black"
-            g["reason"] = "timeout"
+        g.whiteTime = max(0.0, g.whiteTime - elapsed)
+        if g.whiteTime == 0.0 and not g.winner:
+            g.winner = "black"
+            g.reason = "timeout"
     else:  # Black's turn
-        g["blackTime"] = max(0.0, g["blackTime"] - elapsed)
-        if g["blackTime"] == 0.0 and not g["winner"]:
-            g["winner"] = "white" 
-            g["reason"] = "timeout"
+        g.blackTime = max(0.0, g.blackTime - elapsed)
+        if g.blackTime == 0.0 and not g.winner:
+            g.winner = "white" 
+            g.reason = "timeout"
     
-    g["lastUpdate"] = now
+    g.lastUpdate = now
+
+def game_outcome(g):
+    """Return the chess.Outcome if the game just ended, else None.
+
+    Checks run cheapest first: legal-move existence comes from the cached
+    list (which the next click or move reuses anyway), and the repetition
+    scan only runs once a threefold is possible at all.
+    """
+    board: chess.Board = g.board
+    if not legal(g):
+        if board.is_check():
+            return chess.Outcome(chess.Termination.CHECKMATE, not board.turn)
+        return chess.Outcome(chess.Termination.STALEMATE, None)
+    if board.is_insufficient_material():
+        return chess.Outcome(chess.Termination.INSUFFICIENT_MATERIAL, None)
+    # Legal moves exist, so a halfmove clock of 100 is the fifty-move rule
+    if board.halfmove_clock >= 100:
+        return chess.Outcome(chess.Termination.FIFTY_MOVES, None)
+    # A position can't occur three times in fewer than 8 plies
+    if len(board.move_stack) >= 8 and board.is_repetition(3):
+        return chess.Outcome(chess.Termination.THREEFOLD_REPETITION, None)
+    return None
 
 def handle_checkmate_and_draw(g, room):
     """Check for game-ending conditions."""
-    board: chess.Board = g["board"]
-    if board.is_checkmate():
-        g["winner"] = "white" if not board.turn else "black"
-        g["reason"] = "checkmate"
-        print(f"👑 Checkmate! {g['winner'].upper()} wins in room '{room}'")
-    elif (
-        board.is_stalemate()
-        or board.is_insufficient_material()
-        or board.can_claim_threefold_repetition()
-        or board.is_fifty_moves()
-    ):
-        g["winner"] = "draw"
-        g["reason"] = "draw"
-        print(f"🤝 Draw in room '{room}'")
+    gen = g.turn_gen
+    outcome = game_outcome(g)
+    if outcome is None:
+        return
+
+    with g.lock:
+        # A resign/timeout/reset may have landed while game_outcome ran
+        if g.winner or g.turn_gen != gen:
+            return
+        with clock_write(g):
+            if outcome.winner is None:
+                g.winner = "draw"
+            else:
+                g.winner = "white" if outcome.winner else "black"
+            g.reason = outcome.termination.name.lower()
+
+    if outcome.winner is None:
+        logger.info("🤝 Draw (%s) in room '%s'", g.reason, room)
+    else:
+        logger.info("👑 Checkmate! %s wins in room '%s'", g.winner.upper(), room)
 
 @socketio.on("move")
 def on_move(data):
     room = data["room"]
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
-
-    g = games[room]
-    board: chess.Board = g["board"]
+    board: chess.Board = g.board
 
     # ← FIXED: Thread-safe time update and validation
-    with g["lock"]:
-        update_time_before_move(g)
-        
-        if g["winner"]:
-            emit("error", {"message": "Game already finished"})
-            return
-
-        from_pos = data["from"]
-        to_pos = data["to"]
-        promotion_piece = data.get("promotion")
-
-        from_sq = chess.square(from_pos["col"], 7 - from_pos["row"])
-        to_sq = chess.square(to_pos["col"], 7 - to_pos["row"])
-
-        if promotion_piece:
-            prom = {
-                "q": chess.QUEEN,
-                "r": chess.ROOK,
-                "b": chess.BISHOP,
-                "n": chess.KNIGHT,
-            }.get(promotion_piece.lower(), chess.QUEEN)
-            mv = chess.Move(from_sq, to_sq, promotion=prom)
+    # Errors are emitted after the lock is released. Validation runs outside
+    # the clock_write section so clock readers only wait for the field writes.
+    error = None
+    flagged = False
+    with g.lock:
+        if g.winner:
+            error = "Game already finished"
         else:
-            mv = chess.Move(from_sq, to_sq)
-
-        if mv not in board.legal_moves:
-            emit("error", {"message": "Illegal move"})
-            print(f"❌ Illegal move attempted in room '{room}'")
-            return
-
-        board.push(mv)
-        g["draw_offer"] = None
+            from_pos = data["from"]
+            to_pos = data["to"]
+            promotion_piece = data.get("promotion")
+
+            from_sq = pos_to_square(from_pos)
+            to_sq = pos_to_square(to_pos)
+
+            if from_sq is None or to_sq is None:
+                error = "Illegal move"
+            else:
+                if promotion_piece:
+                    prom = _PROMO.get(promotion_piece[:1].lower(), _QUEEN)
+                    mv = _Move(from_sq, to_sq, promotion=prom)
+                else:
+                    mv = _Move(from_sq, to_sq)
+                if (from_sq, to_sq, mv.promotion) not in legal_set(g):
+                    error = "Illegal move"
+
+            if error is None:
+                san = move_to_notation(board, mv)
+                with clock_write(g):
+                    update_time_before_move(g)
+                    if g.winner:  # flag fell before the move arrived
+                        error = "Game already finished"
+                        flagged = True
+                    else:
+                        board.push(mv)
+                        g.turn_gen += 1
+                        g.state_cache = None
+                        g.draw_offer = None
+                        schedule_deadline(room, g)
+
+    if error is not None:
+        emit("error", {"message": error})
+        if error == "Illegal move":
+            logger.debug("❌ Illegal move attempted in room '%s'", room)
+        elif flagged:
+            send_game_update(room)  # the watcher skips rooms with a winner
+        return
 
-    print(f"♟ Move made in room '{room}': {mv}")
+    logger.debug("♟ Move made in room '%s': %s", room, mv)
 
     handle_checkmate_and_draw(g, room)
-    send_game_update(room, mv)
+    send_game_update(room, mv, san)
 
     # Bot move (random) if applicable
     if (
-        g["bot"]
-        and not g["winner"]
-        and g["bot_color"] == ("white" if board.turn else "black")
+        g.bot
+        and not g.winner
+        and g.bot_color == ("white" if board.turn else "black")
     ):
         socketio.start_background_task(bot_move, room)
 
 # ← FIXED: Fair bot timing
 def bot_move(room):
     """Background task: bot with fair timing."""
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
-
-    g = games[room]
     
     # Update bot's clock for thinking time
-    with g["lock"]:
-        update_time_before_move(g)
-        if g["winner"]:  # Check if timeout occurred
-            send_game_update(room)
-            return
+    with g.lock:
+        with clock_write(g):
+            update_time_before_move(g)
+        gen = g.turn_gen
+        flagged = g.winner is not None  # timeout occurred
+    if flagged:
+        send_game_update(room)
+        return
             
     # Bot thinks outside the lock
     time.sleep(1.0)
     
-    # Make the move atomically
-    with g["lock"]:
-        board = g["board"]
-        if board.is_game_over() or g["winner"]:
+    # Make the move atomically; give up if the position changed meanwhile
+    # (e.g. the game was reset while the bot was thinking)
+    with g.lock:
+        board = g.board
+        if g.turn_gen != gen or g.winner or not legal(g):
             return
 
+        error = None
         try:
-            mv = random.choice(list(board.legal_moves))
-            board.push(mv)
-            g["lastUpdate"] = time.time()
-            print(f"🤖 Bot move in room '{room}': {mv}")
+            moves = legal(g)
+            mv = moves[random.randrange(len(moves))]
+            san = move_to_notation(board, mv)
+            with clock_write(g):
+                # Charge the bot for its think time before the turn passes
+                update_time_before_move(g)
+                flagged = g.winner is not None  # flag fell while thinking
+                if not flagged:
+                    board.push(mv)
+                    g.turn_gen += 1
+                    g.state_cache = None
+                    schedule_deadline(room, g)
         except Exception as e:
-            print(f"⚠ Bot failed: {e}")
-            return
+            error = e
+
+    if error is not None:
+        logger.warning("⚠ Bot failed: %s", error)
+        return
+    if flagged:
+        send_game_update(room)  # the watcher skips rooms with a winner
+        return
+    logger.debug("🤖 Bot move in room '%s': %s", room, mv)
 
     handle_checkmate_and_draw(g, room)
-    send_game_update(room, mv)
+    send_game_update(room, mv, san)
+
+def start_timeout_watcher():
+    """Start the timeout watcher once per process, on the server's async model."""
+    global _watcher_thread
+    with _deadlines_cv:
+        if _watcher_thread is None:
+            _watcher_thread = socketio.start_background_task(timeout_watcher)
+
+def schedule_deadline(room, g):
+    """Arm the timeout watcher for the side to move in this room.
+
+    Reads the clock fields directly, so the caller must be the writer.
+    """
+    start_timeout_watcher()
+    left = g.whiteTime if g.board.turn else g.blackTime
+    entry = (g.lastUpdate + left, room, g.turn_gen)
+    with _deadlines_cv:
+        heapq.heappush(_deadlines, entry)
+        _deadlines_cv.notify()
 
 # ← FIXED: Background timeout watcher for reliable timeout detection
 def timeout_watcher():
-    """Background thread to detect timeouts reliably."""
+    """Background task: sleeps until the earliest clock deadline expires."""
     while True:
-        time.sleep(0.5)  # Check every 500ms
-        
-        for room, g in list(games.items()):
-            try:
-                with g["lock"]:
-                    if g["winner"]:
-                        continue
-                        
-                    now = time.time()
-                    elapsed = now - g["lastUpdate"]
-                    board = g["board"]
-                    
-                    if board.turn:  # White's turn
-                        new_time = max(0.0, g["whiteTime"] - elapsed)
-                        if new_time == 0.0 and g["whiteTime"] > 0:
-                            g["whiteTime"] = 0.0
-                            g["winner"] = "black"
-                            g["reason"] = "timeout"
-                            print(f"⏰ WHITE timeout in '{room}'")
-                            send_game_update(room)
-                            continue
-                        g["whiteTime"] = new_time
-                    else:  # Black's turn
-                        new_time = max(0.0, g["blackTime"] - elapsed) 
-                        if new_time == 0.0 and g["blackTime"] > 0:
-                            g["blackTime"] = 0.0
-                            g["winner"] = "white"
-                            g["reason"] = "timeout"
-                            print(f"⏰ BLACK timeout in '{room}'")
-                            send_game_update(room)
-                            continue
-                        g["blackTime"] = new_time
-                    
-                    g["lastUpdate"] = now
-            except Exception as e:
-                print(f"⚠ Timeout watcher error for room '{room}': {e}")
+        with _deadlines_cv:
+            while not _deadlines:
+                _deadlines_cv.wait()
+            deadline, room, gen = _deadlines[0]
+            delay = deadline - time.time()
+            if delay > 0:
+                _deadlines_cv.wait(timeout=delay)
+                continue
+            heapq.heappop(_deadlines)
+
+        g = games.get(room)
+        if g is None or g.turn_gen != gen:
+            continue  # room gone or a move was made since this was armed
+
+        try:
+            with g.lock:
+                if g.winner or g.turn_gen != gen:
+                    continue
+
+                now = time.time()
+                white, black, white_to_move = remaining_times(g, now)
+                if (white if white_to_move else black) > 0:
+                    # Stored clock has more time than this entry assumed; re-arm.
+                    schedule_deadline(room, g)
+                    continue
+
+                with clock_write(g):
+                    if white_to_move:
+                        g.whiteTime = 0.0
+                    else:
+                        g.blackTime = 0.0
+                    g.lastUpdate = now
+                    g.winner = "black" if white_to_move else "white"
+                    g.reason = "timeout"
+            # Log and emit only after the room lock is released
+            loser = "WHITE" if white_to_move else "BLACK"
+            logger.info("⏰ %s timeout in '%s'", loser, room)
+            send_game_update(room)
+        except Exception as e:
+            logger.warning("⚠ Timeout watcher error for room '%s': %s", room, e)
 
 @socketio.on("resign")
 def on_resign(data):
     room = data["room"]
     color = data["color"]
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
-
-    g = games[room]
-    if g["winner"]:
-        return
-
-    g["winner"] = "black" if color == "white" else "white"
-    g["reason"] = "resign"
-    print(f"🏳️ {color.upper()} resigned in room '{room}'")
+    with g.lock:
+        if g.winner:
+            return
+        with clock_write(g):
+            # Charge the side to move so the final clocks are exact
+            update_time_before_move(g)
+            if not g.winner:
+                g.winner = "black" if color == "white" else "white"
+                g.reason = "resign"
+    logger.info("🏳️ %s resigned in room '%s'", color.upper(), room)
     send_game_update(room)
 
 @socketio.on("offer_draw")
@@ -459,15 +744,14 @@ def on_offer_draw(data):
     room = data["room"]
     from_color = data["color"]
 
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
-
-    g = games[room]
-    if g["winner"]:
+    if g.winner:
         return
 
-    g["draw_offer"] = from_color
-    print(f"🤝 {from_color.upper()} offered draw in room '{room}'")
+    g.draw_offer = from_color
+    logger.info("🤝 %s offered draw in room '%s'", from_color.upper(), room)
 
     socketio.emit(
         "draw_offered",
@@ -481,39 +765,48 @@ def on_respond_draw(data):
     room = data["room"]
     accept = data["accept"]
 
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
 
-    g = games[room]
-
     if accept:
-        g["winner"] = "draw"
-        g["reason"] = "agreement"
-        print(f"🤝 Draw accepted in room '{room}'")
+        with g.lock:
+            if g.winner:
+                return
+            with clock_write(g):
+                update_time_before_move(g)
+                if not g.winner:
+                    g.winner = "draw"
+                    g.reason = "agreement"
+        logger.info("🤝 Draw accepted in room '%s'", room)
         send_game_update(room)
     else:
-        g["draw_offer"] = None
-        print(f"❌ Draw declined in room '{room}'")
+        g.draw_offer = None
+        logger.info("❌ Draw declined in room '%s'", room)
         socketio.emit("draw_declined", {}, room=room)
 
 @socketio.on("reset_game")
 def on_reset_game(data):
     room = data["room"]
-    if room not in games:
+    g = games.get(room)
+    if g is None:
         return
 
-    print(f"🔄 Resetting game in room '{room}'")
-    g = games[room]
-    time_control = g.get("whiteTime", 300.0)
-
-    board = chess.Board()
-    g["board"] = board
-    g["whiteTime"] = time_control
-    g["blackTime"] = time_control
-    g["lastUpdate"] = time.time()
-    g["winner"] = None
-    g["reason"] = None
-    g["draw_offer"] = None
+    logger.info("🔄 Resetting game in room '%s'", room)
+    with g.lock, clock_write(g):
+        time_control = g.whiteTime
+
+        board = _STARTING_BOARD.copy(stack=False)
+        g.board = board
+        g.whiteTime = time_control
+        g.blackTime = time_control
+        g.lastUpdate = time.time()
+        g.winner = None
+        g.reason = None
+        g.draw_offer = None
+        g.state_cache = None
+        g.turn_gen += 1
+        schedule_deadline(room, g)
 
     send_game_update(room)
 
@@ -555,7 +848,7 @@ if __name__ == "__main__":
     print("🎮 Chess Master Server Starting (Stockfish OFF)...")
     print("⏰ Starting timeout watcher...")
     # ← FIXED: Start background timeout watcher
-    threading.Thread(target=timeout_watcher, daemon=True).start()
+    start_timeout_watcher()
     print("=" * 50)
     print("🔗 Open http://localhost:5000 in your browser")
     print("=" * 50)